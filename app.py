@@ -1,31 +1,98 @@
-from flask import Flask, render_template, request
-import pickle
-import pandas as pd
+from flask import Flask, render_template, request, jsonify
+import joblib
 import numpy as np
-import shap
 from threshold_optimizer import ThresholdOptimizer
 from revenue_model import RevenueImpactModel
+from micro_batcher import MicroBatcher
+from convert_models import BUNDLE_NAME, CHURN_MODEL_FILES, CATEGORY_MODEL_FILES, load_pickles, stale_pickles
 import os
+import json
+import logging
+import threading
+import base64
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
+# app.py never uses pandas itself, but it must be imported here, before any
+# worker threads exist. sklearn looks up sys.modules['pandas'] on every
+# predict call, so if the first import happened lazily (shap pulls it in on
+# the first /explain), concurrent forest calls could see the half-initialized
+# module and fail.
+import pandas  # noqa: F401
 
 
 app = Flask(__name__)
 
+# Per-request logging; set LOG_LEVEL=DEBUG to see each prediction's details
+logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+log = logging.getLogger('churn')
+log.setLevel(os.environ.get('LOG_LEVEL', 'WARNING').upper())
+
+
+def load_models(model_dir, files):
+    """
+    Load a model directory, preferring its joblib bundle over the individual pickles
+    
+    The bundle (written by convert_models.py) is memory-mapped read-only, so the
+    tree arrays are paged in from disk rather than copied into the heap. It is
+    only used while it is newer than every pickle; after retraining, the fresh
+    pickles are loaded (with a warning) until the bundle is rebuilt.
+    
+    Returns:
+        Dictionary of bundle key -> loaded object (keys of `files`)
+    """
+    bundle_path = os.path.join(model_dir, BUNDLE_NAME)
+    if os.path.exists(bundle_path):
+        stale = stale_pickles(model_dir, files)
+        if not stale:
+            return joblib.load(bundle_path, mmap_mode='r')
+        log.warning("⚠️  %s is older than %s - loading the pickles instead; "
+                    "rerun convert_models.py", bundle_path, ', '.join(stale))
+    return load_pickles(model_dir, files)
+
+
+def drop_feature_names(model, columns):
+    """
+    Check a fitted model's training columns against `columns`, then forget them
+    
+    The models were fitted on DataFrames, but requests reach them as bare
+    numpy rows built in `columns` order. sklearn would warn that X has no
+    feature names on every call, so the order is verified once here instead.
+    """
+    fitted = getattr(model, 'feature_names_in_', None)
+    if fitted is None:
+        return
+    if list(fitted) != list(columns):
+        raise ValueError(f"{type(model).__name__} was fitted on columns in a different order")
+    del model.feature_names_in_
+
+
+# Models are loaded at import time so `gunicorn --preload` loads them once in the
+# master and forked workers share them copy-on-write. Keep per-worker state
+# (threads, open connections) out of import time - create it lazily instead.
+
+# Threads per forest / FastTreeSHAP call (-1 = all cores). Lower it when running
+# several gunicorn workers per machine so they don't oversubscribe the CPUs.
+RF_N_JOBS = int(os.environ.get('RF_N_JOBS', '-1'))
+
 # Load churn prediction models (p_models)
 print("Loading churn prediction models...")
-le = pickle.load(open('./p_models/label_encoder.pkl', 'rb'))
-sc = pickle.load(open('./p_models/standard_scaler.pkl', 'rb'))
-ohe = pickle.load(open('./p_models/onehot_encoder.pkl', 'rb'))
-oe = pickle.load(open('./p_models/ordinal_encoder.pkl', 'rb'))
-rf = pickle.load(open('./p_models/churn_model.pkl', 'rb'))
-feature_names = pickle.load(open('./p_models/feature_names.pkl', 'rb'))
+churn_models = load_models('./p_models', CHURN_MODEL_FILES)
+le, sc, ohe, oe, rf = (churn_models[k] for k in ('le', 'sc', 'ohe', 'oe', 'rf'))
+rf.n_jobs = RF_N_JOBS  # Spread trees over threads (tree traversal releases the GIL)
+feature_names = tuple(churn_models['feature_names'])
+FEATURE_POS = {name: i for i, name in enumerate(feature_names)}
+drop_feature_names(rf, feature_names)
+
+# Column of the "Churned" class in predict_proba / SHAP outputs
+CHURNED_IDX = int(np.where(le.classes_ == "Churned")[0][0])
 
 # Load churn category models (c_models)
 try:
-    rf_category = pickle.load(open('./c_models/category_model.pkl', 'rb'))
-    le_category = pickle.load(open('./c_models/label_encoder.pkl', 'rb'))
-    ohe_category = pickle.load(open('./c_models/onehot_encoder.pkl', 'rb'))
-    oe_category = pickle.load(open('./c_models/ordinal_encoder.pkl', 'rb'))
+    category_models = load_models('./c_models', CATEGORY_MODEL_FILES)
+    rf_category, le_category, ohe_category, oe_category = (
+        category_models[k] for k in ('rf', 'le', 'ohe', 'oe'))
+    rf_category.n_jobs = RF_N_JOBS
     HAS_CATEGORY_MODEL = True
     print("✅ Category model loaded")
 except Exception as e:
@@ -38,6 +105,116 @@ print(f"Churn prediction: Enabled")
 print(f"Category prediction: {'Enabled' if HAS_CATEGORY_MODEL else 'Disabled'}")
 print("=" * 60)
 
+# Raw form fields grouped by how they are encoded
+CATEGORICAL_COLS = ('gender', 'married', 'offer', 'phone_service',
+                    'multiple_lines', 'internet_service', 'internet_type',
+                    'online_security', 'online_backup', 'device_protection_plan',
+                    'premium_tech_support', 'streaming_tv', 'streaming_movies',
+                    'streaming_music', 'unlimited_data', 'contract',
+                    'paperless_billing', 'payment_method')
+
+NUMERICAL_COLS = ('age', 'number_of_dependents', 'number_of_referrals',
+                  'tenure_in_months', 'avg_monthly_long_distance_charges',
+                  'avg_monthly_gb_download', 'monthly_charge',
+                  'total_refunds', 'total_extra_data_charges',
+                  'total_long_distance_charges', 'total_revenue')
+
+ORDINAL_COLS = ('contract', 'offer')
+
+ONEHOT_COLS = ('gender', 'married', 'phone_service', 'multiple_lines',
+               'internet_service', 'internet_type', 'online_security', 'online_backup',
+               'device_protection_plan', 'premium_tech_support',
+               'streaming_tv', 'streaming_movies', 'streaming_music',
+               'unlimited_data', 'paperless_billing', 'payment_method')
+
+
+def normalize_category(value):
+    """Normalize a categorical value for lookup (strip + lowercase)"""
+    if not isinstance(value, str):
+        value = str(value)
+    return value.strip().lower()
+
+
+def build_feature_layout(onehot_encoder, ordinal_encoder, columns):
+    """
+    Precompute where each raw form field is written in a model's feature vector
+    
+    The fitted encoders are only read here, at startup. Requests are then
+    encoded with plain dict lookups into a preallocated numpy row.
+    
+    Args:
+        onehot_encoder: Fitted OneHotEncoder for ONEHOT_COLS
+        ordinal_encoder: Fitted OrdinalEncoder for ORDINAL_COLS
+        columns: Ordered feature names the model was trained on
+    
+    Returns:
+        Dictionary of positional lookups used by encode_features()
+    """
+    position = {name: i for i, name in enumerate(columns)}
+    
+    numeric = [(col, position[col]) for col in NUMERICAL_COLS if col in position]
+    
+    # Category keys are normalized once here, so requests only normalize their own value
+    ordinal = [
+        (col, position[col],
+         {normalize_category(category): code for code, category in enumerate(categories)})
+        for col, categories in zip(ORDINAL_COLS, ordinal_encoder.categories_)
+    ]
+    
+    # One-hot slots follow the encoder's own output names, in categories_ order
+    onehot = []
+    output_names = iter(onehot_encoder.get_feature_names_out(ONEHOT_COLS))
+    for col, categories in zip(ONEHOT_COLS, onehot_encoder.categories_):
+        slots = {}
+        for category, name in zip(categories, output_names):
+            if name in position:
+                slots[normalize_category(category)] = position[name]
+        onehot.append((col, slots))
+    
+    return {
+        'n_features': len(columns),
+        'numeric': numeric,
+        'ordinal': ordinal,
+        'ordinal_unknown': ordinal_encoder.unknown_value,
+        'onehot': onehot
+    }
+
+
+churn_layout = build_feature_layout(ohe, oe, feature_names)
+
+# StandardScaler parameters, applied positionally to the numeric columns in
+# feature order (as the original sc.transform() on that slice did), so scaling
+# is one vectorized (x - mean) / scale on the numeric slots.
+# float32 matches the dtype sklearn's trees split on internally.
+NUMERICAL_FEATURES_TO_SCALE = tuple(col for col in feature_names if col in NUMERICAL_COLS)
+scale_idx = np.array([FEATURE_POS[col] for col in NUMERICAL_FEATURES_TO_SCALE], dtype=np.int64)
+scale_mean = np.ascontiguousarray(sc.mean_, dtype=np.float32)
+scale_std = np.ascontiguousarray(sc.scale_, dtype=np.float32)
+if len(NUMERICAL_FEATURES_TO_SCALE) != sc.n_features_in_:
+    raise ValueError(f"Scaler expects {sc.n_features_in_} numeric features, "
+                     f"found {len(NUMERICAL_FEATURES_TO_SCALE)}")
+scaler_columns = tuple(getattr(sc, 'feature_names_in_', NUMERICAL_FEATURES_TO_SCALE))
+if sorted(scaler_columns) != sorted(NUMERICAL_FEATURES_TO_SCALE):
+    raise ValueError(f"Scaler was fitted on {scaler_columns}, "
+                     f"expected the numeric features {NUMERICAL_FEATURES_TO_SCALE}")
+if scaler_columns != NUMERICAL_FEATURES_TO_SCALE:
+    # The saved scaler lists its columns in another order, so positional scaling
+    # gives each slot another column's mean / scale. Predictions have always been
+    # made this way; aligning the parameters by name would change them.
+    log.warning("⚠️  Scaler columns %s are not in feature order %s - scaling "
+                "parameters are applied positionally", scaler_columns, NUMERICAL_FEATURES_TO_SCALE)
+
+# The category model reuses the churn model's encoded (unscaled) features, which
+# is only valid while both were trained with the same encoders and columns
+if HAS_CATEGORY_MODEL:
+    category_feature_names = list(getattr(rf_category, 'feature_names_in_', feature_names))
+    if build_feature_layout(ohe_category, oe_category, category_feature_names) != churn_layout:
+        HAS_CATEGORY_MODEL = False
+        print("⚠️  Category model encoders differ from churn model encoders - category prediction disabled")
+    else:
+        # Same layout: the churn model's encoded rows fit it position for position
+        drop_feature_names(rf_category, category_feature_names)
+
 # Initialize business modules
 threshold_optimizer = ThresholdOptimizer(
     cost_fp=10,   # Cost of offering retention to a loyal customer
@@ -49,11 +226,62 @@ revenue_model = RevenueImpactModel(
     discount_rate=0.1
 )
 
+# The SHAP explainer is built on first use: importing shap is slow and only
+# /explain needs it. Constructing it walks every tree in the forest, so it is
+# still built just once per process.
+shap_explainer = None
+shap_explainer_lock = threading.Lock()
+
+
+def get_shap_explainer():
+    """SHAP explainer for the churn model (FastTreeSHAP preferred when installed)"""
+    global shap_explainer
+    if shap_explainer is None:
+        with shap_explainer_lock:
+            if shap_explainer is None:
+                try:
+                    from fasttreeshap import TreeExplainer as FastTreeExplainer
+                    explainer = FastTreeExplainer(rf, algorithm='v2', n_jobs=RF_N_JOBS, shortcut=False)
+                    log.info("✅ FastTreeSHAP explainer loaded")
+                except Exception as e:
+                    import shap
+                    explainer = shap.TreeExplainer(rf, feature_perturbation='tree_path_dependent')
+                    log.info("⚠️  FastTreeSHAP not available, using shap.TreeExplainer: %s", e)
+                shap_explainer = explainer
+    return shap_explainer
+
+
+def churned_shap_values(X):
+    """SHAP values of the "Churned" class, one row per row of X"""
+    # The additivity check re-runs the forest on X just to compare margins
+    shap_values = get_shap_explainer().shap_values(X, check_additivity=False)
+    return shap_values[CHURNED_IDX]
+
+
+# Coalesce concurrent requests into single model / SHAP calls
+churn_batcher = MicroBatcher(
+    rf.predict_proba,
+    max_batch_size=16,  # Rows per predict_proba call
+    max_wait_ms=5       # Cap on time spent gathering already-queued rows (no idle wait)
+)
+
+shap_batcher = MicroBatcher(
+    churned_shap_values,
+    max_batch_size=16,
+    max_wait_ms=5
+)
+
+# Runs SHAP and category predictions alongside predict_proba in /explain. Each
+# task blocks on a micro-batch, so size the pool to fill whole batches.
+# Threads are started on first use, i.e. in each gunicorn worker after the fork.
+explain_executor = ThreadPoolExecutor(max_workers=2 * shap_batcher.max_batch_size)
+
 print("✅ Threshold Optimizer initialized")
 print("✅ Revenue Impact Model initialized")
 print("✅ Using DYNAMIC thresholds based on customer CLV")
 print("=" * 60)
 
+@lru_cache(maxsize=None)
 def format_feature_name(feature_name):
     """
     Convert technical feature names to human-readable format
@@ -95,108 +323,251 @@ def format_feature_name(feature_name):
     return feature_name.replace('_', ' ').title()
 
 
-def preprocess_for_churn(data_dict):
-    """Preprocess data for churn prediction (with scaling)"""
-    input_df = pd.DataFrame([data_dict])
-    
-    # Text normalization
-    categorical_cols = ['gender', 'married', 'offer', 'phone_service', 
-                       'multiple_lines', 'internet_service', 'internet_type', 
-                       'online_security', 'online_backup', 'device_protection_plan', 
-                       'premium_tech_support', 'streaming_tv', 'streaming_movies', 
-                       'streaming_music', 'unlimited_data', 'contract', 
-                       'paperless_billing', 'payment_method']
-    
-    for col in categorical_cols:
-        if col in input_df.columns:
-            input_df[col] = input_df[col].astype(str).str.strip().str.lower()
-    
-    # Numerical conversion
-    numerical_cols = ['age', 'number_of_dependents', 'number_of_referrals', 
-                     'tenure_in_months', 'avg_monthly_long_distance_charges',
-                     'avg_monthly_gb_download', 'monthly_charge',
-                     'total_refunds', 'total_extra_data_charges', 
-                     'total_long_distance_charges', 'total_revenue']
-    
-    for col in numerical_cols:
-        if col in input_df.columns:
-            input_df[col] = pd.to_numeric(input_df[col], errors='coerce')
-    
-    # Ordinal encoding
-    ordinal_cols = ['contract', 'offer']
-    input_df[ordinal_cols] = oe.transform(input_df[ordinal_cols])
-    
-    # OneHot encoding
-    onehot_cols = ['gender', 'married', 'phone_service', 'multiple_lines',
-                  'internet_service', 'internet_type', 'online_security', 'online_backup',
-                  'device_protection_plan', 'premium_tech_support',
-                  'streaming_tv', 'streaming_movies', 'streaming_music',
-                  'unlimited_data', 'paperless_billing', 'payment_method']
-    
-    input_ohe = ohe.transform(input_df[onehot_cols])
-    ohe_feature_names = ohe.get_feature_names_out(onehot_cols)
-    input_ohe_df = pd.DataFrame(input_ohe, columns=ohe_feature_names, index=input_df.index)
-    input_df = pd.concat([input_df.drop(columns=onehot_cols), input_ohe_df], axis=1)
-    
-    # Filter and reindex
-    columns_to_keep = [col for col in input_df.columns if col in feature_names]
-    input_df = input_df[columns_to_keep]
-    input_df = input_df.reindex(columns=feature_names, fill_value=0)
-    
-    # Standard scaling
-    numerical_features_to_scale = [col for col in feature_names if col in numerical_cols]
-    numerical_data = input_df[numerical_features_to_scale].values
-    scaled_numerical_data = sc.transform(numerical_data)
-    
-    for i, col in enumerate(numerical_features_to_scale):
-        input_df[col] = scaled_numerical_data[:, i]
-    
-    return input_df
-
-def preprocess_for_category(data_dict):
-    """Preprocess data for category prediction (without scaling)"""
-    input_df = pd.DataFrame([data_dict])
-    
-    # Text normalization
-    categorical_cols = ['gender', 'married', 'offer', 'phone_service', 
-                       'multiple_lines', 'internet_service', 'internet_type', 
-                       'online_security', 'online_backup', 'device_protection_plan', 
-                       'premium_tech_support', 'streaming_tv', 'streaming_movies', 
-                       'streaming_music', 'unlimited_data', 'contract', 
-                       'paperless_billing', 'payment_method']
-    
-    for col in categorical_cols:
-        if col in input_df.columns:
-            input_df[col] = input_df[col].astype(str).str.strip().str.lower()
-    
-    # Numerical conversion
-    numerical_cols = ['age', 'number_of_dependents', 'number_of_referrals', 
-                     'tenure_in_months', 'avg_monthly_long_distance_charges',
-                     'avg_monthly_gb_download', 'monthly_charge',
-                     'total_refunds', 'total_extra_data_charges', 
-                     'total_long_distance_charges', 'total_revenue']
-    
-    for col in numerical_cols:
-        if col in input_df.columns:
-            input_df[col] = pd.to_numeric(input_df[col], errors='coerce')
-    
-    # Ordinal encoding (using category model's encoder)
-    ordinal_cols = ['contract', 'offer']
-    input_df[ordinal_cols] = oe_category.transform(input_df[ordinal_cols])
-    
-    # OneHot encoding (using category model's encoder)
-    onehot_cols = ['gender', 'married', 'phone_service', 'multiple_lines',
-                  'internet_service', 'internet_type', 'online_security', 'online_backup',
-                  'device_protection_plan', 'premium_tech_support',
-                  'streaming_tv', 'streaming_movies', 'streaming_music',
-                  'unlimited_data', 'paperless_billing', 'payment_method']
-    
-    input_ohe = ohe_category.transform(input_df[onehot_cols])
-    ohe_feature_names = ohe_category.get_feature_names_out(onehot_cols)
-    input_ohe_df = pd.DataFrame(input_ohe, columns=ohe_feature_names, index=input_df.index)
-    input_df = pd.concat([input_df.drop(columns=onehot_cols), input_ohe_df], axis=1)
-    
-    return input_df
+# The vocabulary is fixed, so format every name once up front
+for name in feature_names:
+    format_feature_name(name)
+
+
+# Row-building kernels. Numba is pinned in requirements.txt, but every compiled
+# kernel (here, in threshold_optimizer and in revenue_model) has a numpy
+# fallback with identical results, so without Numba the app only runs slower.
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+if HAS_NUMBA:
+    @njit(cache=True)
+    def fill_row(n_features, idx, values):
+        """Scatter values into a zeroed (1, n_features) float32 row"""
+        x = np.zeros((1, n_features), dtype=np.float32)
+        for k in range(idx.shape[0]):
+            x[0, idx[k]] = values[k]
+        return x
+
+    @njit(cache=True)
+    def scale_row(x_encoded, idx, mean, std):
+        """Return a copy of the row with (x - mean) / std applied at idx"""
+        x = x_encoded.copy()
+        for k in range(idx.shape[0]):
+            j = idx[k]
+            x[0, j] = (x[0, j] - mean[k]) / std[k]
+        return x
+else:
+    def fill_row(n_features, idx, values):
+        """Scatter values into a zeroed (1, n_features) float32 row"""
+        x = np.zeros((1, n_features), dtype=np.float32)
+        x[0, idx] = values
+        return x
+
+    def scale_row(x_encoded, idx, mean, std):
+        """Return a copy of the row with (x - mean) / std applied at idx"""
+        x = x_encoded.copy()
+        x[0, idx] = (x[0, idx] - mean) / std
+        return x
+
+
+def to_float(value):
+    """Parse a form value as float, returning NaN when it is not numeric"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def clean_inputs(data_dict):
+    """
+    Model inputs from raw form data, normalized once per request
+    
+    Numeric fields are parsed with to_float() (NaN when not numeric); every
+    categorical field is normalized (strip + lowercase).
+    
+    Raises:
+        ValueError: If any model input field is missing from the form
+    """
+    missing = [col for col in NUMERICAL_COLS + CATEGORICAL_COLS if col not in data_dict]
+    if missing:
+        raise ValueError(f"Missing form fields: {', '.join(missing)}")
+    inputs = {col: to_float(data_dict[col]) for col in NUMERICAL_COLS}
+    for col in CATEGORICAL_COLS:
+        inputs[col] = normalize_category(data_dict[col])
+    return inputs
+
+
+def encode_features(inputs, layout):
+    """
+    Encode cleaned inputs (see clean_inputs) into a single-row feature array (unscaled)
+    
+    Categorical values are mapped through the precomputed layout; unknown
+    one-hot values leave their slots at 0, unknown ordinal values get the
+    encoder's unknown_value. Only the dict lookups run in Python; the row
+    itself is written by fill_row().
+    """
+    idx = []
+    values = []
+    
+    for col, i in layout['numeric']:
+        idx.append(i)
+        values.append(inputs[col])
+    
+    for col, i, codes in layout['ordinal']:
+        idx.append(i)
+        values.append(codes.get(inputs[col], layout['ordinal_unknown']))
+    
+    for col, slots in layout['onehot']:
+        i = slots.get(inputs[col])
+        if i is not None:
+            idx.append(i)
+            values.append(1.0)
+    
+    return fill_row(layout['n_features'],
+                    np.array(idx, dtype=np.int64),
+                    np.array(values, dtype=np.float32))
+
+def preprocess_for_churn(x_encoded):
+    """Scale an encoded feature row for churn prediction (returns a new array)"""
+    return scale_row(x_encoded, scale_idx, scale_mean, scale_std)
+
+
+# Compile the kernels now rather than on the first request
+preprocess_for_churn(encode_features(
+    clean_inputs(dict.fromkeys(NUMERICAL_COLS + CATEGORICAL_COLS, '')), churn_layout))
+
+
+def request_key(data_dict):
+    """
+    Canonical, hashable form of the model inputs in a request
+    
+    The key is the clean_inputs() dict as a tuple, so requests with the same
+    key always get the same predictions and explanations.
+    """
+    return tuple(clean_inputs(data_dict).items())
+
+
+# Results below are cached per request key (repeat submissions skip RF + SHAP).
+# Everything returned is immutable, so cached values are safe to share across threads.
+
+@lru_cache(maxsize=4096)
+def encode_request(key):
+    """Encoded (unscaled) and churn-scaled feature rows for a request key"""
+    x_encoded = encode_features(dict(key), churn_layout)
+    x_churn = preprocess_for_churn(x_encoded)
+    x_encoded.flags.writeable = False
+    x_churn.flags.writeable = False
+    return x_encoded, x_churn
+
+@lru_cache(maxsize=4096)
+def predict_churn_probability(key):
+    """Probability of the "Churned" class for a request key"""
+    _, x_churn = encode_request(key)
+    churn_proba = churn_batcher.submit(x_churn)
+    return churn_proba[CHURNED_IDX]
+
+@lru_cache(maxsize=4096)
+def explain_churn(key):
+    """
+    Top 10 SHAP risk factors pushing a request towards churn
+    
+    Returns:
+        Tuple of (readable feature name, impact %) pairs, largest first
+    """
+    _, x_churn = encode_request(key)
+    vals = np.asarray(shap_batcher.submit(x_churn))
+    
+    # argpartition, then sort only the winners
+    pos_idx = np.nonzero(vals > 0)[0]
+    k = min(10, pos_idx.size)
+    top_idx = pos_idx[np.argpartition(-vals[pos_idx], k - 1)[:k]] if k else pos_idx
+    top_idx = top_idx[np.argsort(-vals[top_idx])]
+    
+    return tuple(
+        (format_feature_name(feature_names[i]), round(float(vals[i]) * 100, 2))
+        for i in top_idx
+    )
+
+@lru_cache(maxsize=4096)
+def predict_category(key):
+    """Churn category label for a request key (category model uses unscaled features)"""
+    x_encoded, _ = encode_request(key)
+    category_prediction = rf_category.predict(x_encoded)
+    return le_category.inverse_transform(category_prediction)[0]
+
+# Key insights: (condition on the parsed inputs, message filled with the raw form values)
+INSIGHT_RULES = (
+    (lambda v: v['contract'] == 'Month-to-Month', "Month-to-Month contract - no commitment"),
+    (lambda v: v['tenure_in_months'] < 6, "Very short tenure ({tenure_in_months} months)"),
+    (lambda v: v['total_refunds'] > 0, "Has refunds (${total_refunds}) - dissatisfaction indicator"),
+    (lambda v: v['total_extra_data_charges'] > 0, "Extra data charges (${total_extra_data_charges}) - unexpected costs"),
+    (lambda v: v['number_of_referrals'] == 0, "Zero referrals - not engaged"),
+    (lambda v: v['monthly_charge'] > 80, "High monthly charge (${monthly_charge})"),
+)
+
+# Category-specific retention actions: (icon, header note, actions).
+# Keys are matched in order as substrings of the lowercased category label.
+CATEGORY_RECOMMENDATIONS = {
+    'competitor': ("🏆", "Competitive threat detected", (
+        "🔍 Conduct competitive analysis - identify what competitor is offering",
+        "💳 Counter-offer: Match or beat competitor pricing",
+        "⭐ Highlight unique value propositions and differentiators",
+    )),
+    'dissatisfaction': ("😞", "Service quality issues", (
+        "🆘 Immediate customer service escalation",
+        "🔧 Address specific pain points and service issues",
+        "🎁 Offer premium service upgrade at no cost for 3 months",
+    )),
+    'price': ("💸", "Price sensitivity", (
+        "💰 Review pricing tier - consider loyalty discount (10-15%)",
+        "📦 Bundle services for better perceived value",
+        "📈 Show cost-benefit analysis vs competitors",
+    )),
+    'attitude': ("😠", "Service attitude concerns", (
+        "🙏 Formal apology from management",
+        "👤 Assign dedicated account manager",
+        "🎓 Internal customer service training review",
+    )),
+}
+
+DEFAULT_CATEGORY_RECOMMENDATIONS = ("❓", None, (
+    "📋 Conduct detailed exit interview",
+    "🔬 Deep-dive analysis of customer journey",
+))
+
+
+@lru_cache(maxsize=None)
+def category_recommendations(category_label):
+    """
+    Header line and retention actions for a churn category label
+    
+    Returns:
+        (header, actions) - header goes first in the action plan, actions last
+    """
+    label = category_label.lower()
+    icon, note, actions = next(
+        (recs for keyword, recs in CATEGORY_RECOMMENDATIONS.items() if keyword in label),
+        DEFAULT_CATEGORY_RECOMMENDATIONS
+    )
+    header = f"{icon} Category: {category_label}" + (f" - {note}" if note else "")
+    return header, actions
+
+
+# CLV tier lower bounds and the minimum threshold for each tier (low -> very high value)
+CLV_TIER_BOUNDS = (200.0, 500.0, 1000.0, 2000.0)
+THRESHOLD_FLOORS = (0.45, 0.40, 0.35, 0.30, 0.25)
+MAX_THRESHOLD = 0.65  # Cap at reasonable maximum
+
+
+def dynamic_threshold_kernel(clv, retention_cost):
+    """Unrounded dynamic threshold (compiled with Numba when available)"""
+    optimal_threshold = retention_cost / (retention_cost + clv)
+    tier = ((clv >= CLV_TIER_BOUNDS[0]) + (clv >= CLV_TIER_BOUNDS[1])
+            + (clv >= CLV_TIER_BOUNDS[2]) + (clv >= CLV_TIER_BOUNDS[3]))
+    return min(max(optimal_threshold, THRESHOLD_FLOORS[tier]), MAX_THRESHOLD)
+
+
+if HAS_NUMBA:
+    dynamic_threshold_kernel = njit(cache=True)(dynamic_threshold_kernel)
+
 
 def calculate_dynamic_threshold(clv, retention_cost=50):
     """
@@ -209,6 +580,9 @@ def calculate_dynamic_threshold(clv, retention_cost=50):
     Formula: threshold = FP_cost / (FP_cost + FN_cost)
     where FN_cost = CLV (revenue we'd lose)
     
+    The result is floored per CLV tier (25% for very high value customers
+    up to 45% for low value ones) and capped at 65%.
+    
     Args:
         clv: Customer Lifetime Value
         retention_cost: Cost of retention campaign (FP cost)
@@ -216,26 +590,236 @@ def calculate_dynamic_threshold(clv, retention_cost=50):
     Returns:
         Optimal threshold for this customer
     """
-    fn_cost = clv  
-    optimal_threshold = retention_cost / (retention_cost + fn_cost)
+    return round(dynamic_threshold_kernel(float(clv), float(retention_cost)), 3)
+
+
+# Compile before the first request
+calculate_dynamic_threshold(0.0)
+
+
+def encode_explain_token(data_dict):
+    """Opaque token carrying a request's form data (model inputs only) from /predict to /explain"""
+    inputs = {col: data_dict[col] for col in NUMERICAL_COLS + CATEGORICAL_COLS if col in data_dict}
+    return base64.urlsafe_b64encode(json.dumps(inputs).encode()).decode()
+
+
+def decode_explain_token(token):
+    """Form data dict back from an explain token (raises ValueError if malformed)"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception as e:
+        raise ValueError(f"Invalid explain token: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("Invalid explain token")
+    return {str(k): str(v) for k, v in data.items()}
+
+
+def assess_customer(data):
+    """
+    Churn prediction, revenue impact, insights and basic recommendations
+    
+    This is everything /predict renders. SHAP and the category model are left
+    to explain_customer(), which only runs when the explanation is requested.
+    """
+    # Predict churn status (probability of "Churned" class)
+    key = request_key(data)
+    churn_probability = predict_churn_probability(key)
+    
+    # Calculate revenue impact FIRST (to determine threshold)
+    customer_data = {
+        'monthly_charge': float(data.get('monthly_charge', 0)),
+        'tenure_in_months': int(data.get('tenure_in_months', 0)),
+        'total_revenue': float(data.get('total_revenue', 0))
+    }
+    
+    # Calculate CLV first
+    clv = revenue_model.calculate_clv_advanced(
+        customer_data['monthly_charge'],
+        customer_data['tenure_in_months'],
+        customer_data['total_revenue']
+    )
+    
+    # Calculate DYNAMIC threshold based on this customer's value
+    retention_cost = 50  # Base retention campaign cost
+    dynamic_threshold = calculate_dynamic_threshold(clv, retention_cost)
+    
+    log.debug("💰 Customer CLV: $%.2f", clv)
+    log.debug("🎯 Dynamic Threshold for this customer: %.3f", dynamic_threshold)
+    
+    # Use threshold optimizer for business-aware prediction
+    # The threshold is passed per call: the optimizer is shared by concurrent requests
+    threshold_result = threshold_optimizer.predict_single(churn_probability, threshold=dynamic_threshold)
+    prediction_label = "Churned" if threshold_result['prediction'] == 1 else "Stayed"
+    
+    log.debug("✅ Churn Probability: %.2f%%", churn_probability * 100)
+    log.debug("✅ Prediction: %s (Risk: %s)", prediction_label, threshold_result['risk_level'])
+    
+    # Calculate full revenue impact
+    revenue_impact = revenue_model.get_customer_revenue_impact(
+        customer_data, 
+        churn_probability
+    )
+    
+    log.debug("💰 CLV: $%.2f", revenue_impact['customer_lifetime_value'])
+    log.debug("💰 Revenue at Risk: $%.2f", revenue_impact['revenue_at_risk'])
+    
+    # Generate insights for ALL predictions (not just churned)
+    insight_values = {
+        'contract': data.get('contract'),
+        'tenure_in_months': customer_data['tenure_in_months'],
+        'total_refunds': float(data.get('total_refunds', 0)),
+        'total_extra_data_charges': float(data.get('total_extra_data_charges', 0)),
+        'number_of_referrals': int(data.get('number_of_referrals', 0)),
+        'monthly_charge': customer_data['monthly_charge']
+    }
+    insights = [
+        message.format_map({field: data.get(field) for field in insight_values})
+        for condition, message in INSIGHT_RULES
+        if condition(insight_values)
+    ]
+    recommendations = []
+    
+    # Generate basic recommendations for CHURNED customers
+    if prediction_label == "Churned":
+        # Add revenue-based recommendations
+        if revenue_impact['recommended_offer'] != 'Monitor Only':
+            offer = revenue_impact['recommended_offer']
+            roi_data = revenue_impact['roi_analysis'][offer]
+            recommendations.append(f"💰 Offer {offer.title()} retention package (Expected ROI: {roi_data['roi_percentage']:.0f}%)")
+            recommendations.append(f"   Investment: ${roi_data['retention_cost']:.2f} | Potential Benefit: ${roi_data['net_benefit']:.2f}")
+        
+        # Add priority-based recommendation
+        recommendations.append(f"🚨 {revenue_impact['priority']} - {threshold_result['recommendation']}")
+        
+        # Add general retention strategies
+        recommendations.append("📞 Immediate outreach within 24 hours")
+        recommendations.append("🎁 Personalized retention offer based on customer profile")
+        recommendations.append("📊 Schedule account review meeting")
+        recommendations.append("💡 Highlight unused services or features")
+    
+    return {
+        'key': key,
+        'churn_probability': churn_probability,
+        'prediction': prediction_label,
+        'threshold_result': threshold_result,
+        'revenue_impact': revenue_impact,
+        'insights': insights,
+        'recommendations': recommendations
+    }
+
+
+def start_explanation(key):
+    """
+    Start SHAP and the category model for a request key on explain_executor
+    
+    Returns:
+        Dictionary of futures: 'top_features' and, when enabled, 'category'
+    """
+    futures = {'top_features': explain_executor.submit(explain_churn, key)}
+    if HAS_CATEGORY_MODEL:
+        futures['category'] = explain_executor.submit(predict_category, key)
+    return futures
+
+
+def explain_customer(assessment, futures=None):
+    """
+    Add SHAP risk factors and the churn category to an assessment (churned only)
+    
+    Args:
+        assessment: Result of assess_customer()
+        futures: Work already started with start_explanation() for this
+            assessment's key (started here when omitted)
+    
+    Returns:
+        The assessment with 'top_features' and 'category' set, and the
+        category-specific actions merged into its recommendations
+    """
+    assessment['top_features'] = None
+    assessment['category'] = None
+    if assessment['prediction'] != "Churned":
+        return assessment
+    
+    # SHAP and the category forest both run in native code, so they run side by side
+    if futures is None:
+        futures = start_explanation(assessment['key'])
     
-    if clv >= 2000:  # Very high value
-        optimal_threshold = max(optimal_threshold, 0.25)  # At least 25%
-    elif clv >= 1000:  # High value
-        optimal_threshold = max(optimal_threshold, 0.30)  # At least 30%
-    elif clv >= 500:  # Medium value
-        optimal_threshold = max(optimal_threshold, 0.35)  # At least 35%
-    elif clv >= 200:  # Standard value
-        optimal_threshold = max(optimal_threshold, 0.40)  # At least 40%
-    else:  # Low value
-        optimal_threshold = max(optimal_threshold, 0.45)  # At least 45%
+    # Calculate SHAP values for ALL churned customers
+    try:
+        # Compute SHAP values for churn model
+        log.debug("🔍 Computing SHAP values...")
+        assessment['top_features'] = [
+            {'name': name, 'value': value}
+            for name, value in futures['top_features'].result()
+        ]
+        
+        log.debug("✅ SHAP analysis complete - %d risk factors identified", len(assessment['top_features']))
+        
+    except Exception as e:
+        log.exception("⚠️  Error calculating SHAP values: %s", e)
     
-    # Cap at reasonable maximum
-    optimal_threshold = min(optimal_threshold, 0.65)
+    # If category model exists, predict category
+    if 'category' in futures:
+        try:
+            # Predict category
+            category_label = futures['category'].result()
+            assessment['category'] = category_label
+            
+            log.debug("✅ Category: %s", category_label)
+            
+            # Add category-specific recommendations
+            header, actions = category_recommendations(category_label)
+            assessment['recommendations'] = [header, *assessment['recommendations'], *actions]
+            
+        except Exception as e:
+            log.exception("⚠️  Error in category/SHAP: %s", e)
     
-    return round(optimal_threshold, 3)
+    return assessment
+
+
+def assessment_fields(assessment):
+    """Values shown on the results page for an assessment (shared by HTML and JSON)"""
+    threshold_result = assessment['threshold_result']
+    revenue_impact = assessment['revenue_impact']
+    return {
+        'prediction': assessment['prediction'],
+        'churn_probability': round(assessment['churn_probability'] * 100, 1),
+        'risk_level': threshold_result['risk_level'],
+        'risk_color': threshold_result['color'],
+        'threshold_used': round(threshold_result['threshold_used'], 3),
+        'clv': revenue_impact['customer_lifetime_value'],
+        'revenue_at_risk': revenue_impact['revenue_at_risk'],
+        'revenue_tier': revenue_impact['revenue_tier'],
+        'priority': revenue_impact['priority'],
+        'recommended_offer': revenue_impact['recommended_offer'],
+        'category': assessment.get('category'),
+        'top_features': assessment.get('top_features'),
+        'insights': assessment['insights'],
+        'recommendations': assessment['recommendations']
+    }
 
 
+def wants_json():
+    """True when the caller asked for JSON (Accept header or ?format=json)"""
+    return (request.args.get('format') == 'json'
+            or request.accept_mimetypes.best == 'application/json')
+
+
+def respond(assessment, **extra):
+    """JSON for programmatic clients, otherwise the rendered index.html"""
+    fields = assessment_fields(assessment)
+    fields.update(extra)
+    if wants_json():
+        return jsonify(fields)
+    return render_template('index.html', **fields)
+
+
+def respond_error(e):
+    """Log an exception and return it in the format the caller asked for"""
+    log.exception("❌ ERROR: %s", e)
+    if wants_json():
+        return jsonify(error=str(e)), 400
+    return render_template('index.html', prediction=f"Error: {str(e)}")
+
 
 @app.route('/')
 def home():
@@ -243,193 +827,44 @@ def home():
 
 @app.route('/predict', methods=['POST'])
 def predict():
+    """
+    Prediction and revenue impact; the SHAP explanation is fetched from /explain
+    
+    Returns JSON instead of the page for `Accept: application/json` or ?format=json.
+    """
     try:
         data = request.form.to_dict()
+        assessment = assess_customer(data)
         
-        # Predict churn status
-        input_df_churn = preprocess_for_churn(data)
-        churn_proba = rf.predict_proba(input_df_churn)[0]
-        
-        # Get churn probability (probability of "Churned" class)
-        churned_class_index = list(le.classes_).index("Churned")
-        churn_probability = churn_proba[churned_class_index]
-        
-        # Calculate revenue impact FIRST (to determine threshold)
-        customer_data = {
-            'monthly_charge': float(data.get('monthly_charge', 0)),
-            'tenure_in_months': int(data.get('tenure_in_months', 0)),
-            'total_revenue': float(data.get('total_revenue', 0))
-        }
-        
-        # Calculate CLV first
-        clv = revenue_model.calculate_clv_advanced(
-            customer_data['monthly_charge'],
-            customer_data['tenure_in_months'],
-            customer_data['total_revenue']
-        )
-        
-        # Calculate DYNAMIC threshold based on this customer's value
-        retention_cost = 50  # Base retention campaign cost
-        dynamic_threshold = calculate_dynamic_threshold(clv, retention_cost)
-        
-        # Update optimizer with customer-specific threshold
-        threshold_optimizer.optimal_threshold = dynamic_threshold
-        
-        print(f"💰 Customer CLV: ${clv:,.2f}")
-        print(f"🎯 Dynamic Threshold for this customer: {dynamic_threshold:.3f}")
-        
-        # Use threshold optimizer for business-aware prediction
-        threshold_result = threshold_optimizer.predict_single(churn_probability)
-        prediction_label = "Churned" if threshold_result['prediction'] == 1 else "Stayed"
-        
-        print(f"✅ Churn Probability: {churn_probability:.2%}")
-        print(f"✅ Prediction: {prediction_label} (Risk: {threshold_result['risk_level']})")
-        
-        # Calculate full revenue impact
-        revenue_impact = revenue_model.get_customer_revenue_impact(
-            customer_data, 
-            churn_probability
-        )
-        
-        print(f"💰 CLV: ${revenue_impact['customer_lifetime_value']:,.2f}")
-        print(f"💰 Revenue at Risk: ${revenue_impact['revenue_at_risk']:,.2f}")
+        explain_token = None
+        if assessment['prediction'] == "Churned":
+            explain_token = encode_explain_token(data)
         
-        # Initialize response variables
-        category_label = None
-        top_features = None
-        insights = []
-        recommendations = []
+        return respond(assessment, explain_token=explain_token)
         
-        # Generate insights for ALL predictions (not just churned)
-        if data.get('contract') == 'Month-to-Month':
-            insights.append("Month-to-Month contract - no commitment")
-        if int(data.get('tenure_in_months', 0)) < 6:
-            insights.append(f"Very short tenure ({data.get('tenure_in_months')} months)")
-        if float(data.get('total_refunds', 0)) > 0:
-            insights.append(f"Has refunds (${data.get('total_refunds')}) - dissatisfaction indicator")
-        if float(data.get('total_extra_data_charges', 0)) > 0:
-            insights.append(f"Extra data charges (${data.get('total_extra_data_charges')}) - unexpected costs")
-        if int(data.get('number_of_referrals', 0)) == 0:
-            insights.append("Zero referrals - not engaged")
-        if float(data.get('monthly_charge', 0)) > 80:
-            insights.append(f"High monthly charge (${data.get('monthly_charge')})")
-        
-        # Generate basic recommendations for CHURNED customers
-        if prediction_label == "Churned":
-            # Add revenue-based recommendations
-            if revenue_impact['recommended_offer'] != 'Monitor Only':
-                offer = revenue_impact['recommended_offer']
-                roi_data = revenue_impact['roi_analysis'][offer]
-                recommendations.append(f"💰 Offer {offer.title()} retention package (Expected ROI: {roi_data['roi_percentage']:.0f}%)")
-                recommendations.append(f"   Investment: ${roi_data['retention_cost']:.2f} | Potential Benefit: ${roi_data['net_benefit']:.2f}")
-            
-            # Add priority-based recommendation
-            recommendations.append(f"🚨 {revenue_impact['priority']} - {threshold_result['recommendation']}")
-            
-            # Add general retention strategies
-            recommendations.append("📞 Immediate outreach within 24 hours")
-            recommendations.append("🎁 Personalized retention offer based on customer profile")
-            recommendations.append("📊 Schedule account review meeting")
-            recommendations.append("💡 Highlight unused services or features")
-        
-        # Calculate SHAP values for ALL churned customers
-        if prediction_label == "Churned":
-            try:
-                # Compute SHAP values for churn model
-                print("🔍 Computing SHAP values...")
-                explainer = shap.TreeExplainer(rf)
-                shap_values = explainer.shap_values(input_df_churn)
-                
-                # Get SHAP values for "Churned" class
-                shap_values_churned = shap_values[churned_class_index][0]
-                
-                # Get top features
-                feature_impact = pd.DataFrame({
-                    'feature': feature_names,
-                    'shap_value': shap_values_churned
-                })
-                feature_impact = feature_impact.sort_values('shap_value', ascending=False)
-                top_hurting = feature_impact[feature_impact['shap_value'] > 0].head(10)
-                
-                top_features = [
-                    {
-                        'name': format_feature_name(row['feature']),  
-                        'value': round(row['shap_value'] * 100, 2)
-                    }
-                    for idx, row in top_hurting.iterrows()
-                ]
-                
-                print(f"✅ SHAP analysis complete - {len(top_features)} risk factors identified")
-                
-            except Exception as e:
-                print(f"⚠️  Error calculating SHAP values: {e}")
-                import traceback
-                traceback.print_exc()
-        
-        # If churned AND category model exists, predict category
-        if prediction_label == "Churned" and HAS_CATEGORY_MODEL:
-            try:
-                # Preprocess for category prediction
-                input_df_category = preprocess_for_category(data)
-                
-                # Predict category
-                category_prediction = rf_category.predict(input_df_category)
-                category_label = le_category.inverse_transform(category_prediction)[0]
-                
-                print(f"✅ Category: {category_label}")
-                
-                # Add category-specific recommendations
-                if 'competitor' in category_label.lower():
-                    recommendations.insert(0, f"🏆 Category: {category_label} - Competitive threat detected")
-                    recommendations.append("🔍 Conduct competitive analysis - identify what competitor is offering")
-                    recommendations.append("💳 Counter-offer: Match or beat competitor pricing")
-                    recommendations.append("⭐ Highlight unique value propositions and differentiators")
-                elif 'dissatisfaction' in category_label.lower():
-                    recommendations.insert(0, f"😞 Category: {category_label} - Service quality issues")
-                    recommendations.append("🆘 Immediate customer service escalation")
-                    recommendations.append("🔧 Address specific pain points and service issues")
-                    recommendations.append("🎁 Offer premium service upgrade at no cost for 3 months")
-                elif 'price' in category_label.lower():
-                    recommendations.insert(0, f"💸 Category: {category_label} - Price sensitivity")
-                    recommendations.append("💰 Review pricing tier - consider loyalty discount (10-15%)")
-                    recommendations.append("📦 Bundle services for better perceived value")
-                    recommendations.append("📈 Show cost-benefit analysis vs competitors")
-                elif 'attitude' in category_label.lower():
-                    recommendations.insert(0, f"😠 Category: {category_label} - Service attitude concerns")
-                    recommendations.append("🙏 Formal apology from management")
-                    recommendations.append("👤 Assign dedicated account manager")
-                    recommendations.append("🎓 Internal customer service training review")
-                else:
-                    recommendations.insert(0, f"❓ Category: {category_label}")
-                    recommendations.append("📋 Conduct detailed exit interview")
-                    recommendations.append("🔬 Deep-dive analysis of customer journey")
-                
-            except Exception as e:
-                print(f"⚠️  Error in category/SHAP: {e}")
-                import traceback
-                traceback.print_exc()
+    except Exception as e:
+        return respond_error(e)
+
+@app.route('/explain', methods=['POST'])
+def explain():
+    """
+    SHAP risk factors, churn category and full action plan for a prediction
+    
+    Accepts the token /predict rendered (or the raw form fields). Returns JSON
+    for fetch() calls from the page, and the full results page otherwise.
+    """
+    try:
+        token = request.form.get('explain_token')
+        data = decode_explain_token(token) if token else request.form.to_dict()
         
-        return render_template('index.html', 
-                             prediction=prediction_label,
-                             churn_probability=round(churn_probability * 100, 1),
-                             risk_level=threshold_result['risk_level'],
-                             risk_color=threshold_result['color'],
-                             threshold_used=round(threshold_result['threshold_used'], 3),
-                             clv=revenue_impact['customer_lifetime_value'],
-                             revenue_at_risk=revenue_impact['revenue_at_risk'],
-                             revenue_tier=revenue_impact['revenue_tier'],
-                             priority=revenue_impact['priority'],
-                             recommended_offer=revenue_impact['recommended_offer'],
-                             category=category_label,
-                             top_features=top_features,
-                             insights=insights,
-                             recommendations=recommendations)
+        # /explain is requested for churned customers, so start SHAP and the
+        # category model before predict_proba instead of after it. If the
+        # customer turns out to have stayed, the results are just cached.
+        futures = start_explanation(request_key(data))
+        return respond(explain_customer(assess_customer(data), futures))
         
     except Exception as e:
-        import traceback
-        error_msg = traceback.format_exc()
-        print("❌ ERROR:", error_msg)
-        return render_template('index.html', prediction=f"Error: {str(e)}")
+        return respond_error(e)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Model Converter - Pack Model Pickles into Memory-Mapped Bundles
+
+The training notebooks save each fitted object as its own pickle. This script
+packs every model directory into a single uncompressed joblib bundle, so
+app.py loads it with one joblib.load(mmap_mode='r') call. The large numpy
+arrays (Random Forest trees, scaler parameters) are then mapped from disk
+instead of being read into each process's heap.
+
+The bundles are build artifacts, not committed: they are generated at deploy
+time (bin/post_compile) and should be rebuilt after retraining:
+    python convert_models.py
+"""
+
+import os
+import pickle
+
+import joblib
+
+
+# Bundle key -> pickle file, per model directory (same keys app.py reads)
+CHURN_MODEL_FILES = {
+    'le': 'label_encoder.pkl',
+    'sc': 'standard_scaler.pkl',
+    'ohe': 'onehot_encoder.pkl',
+    'oe': 'ordinal_encoder.pkl',
+    'rf': 'churn_model.pkl',
+    'feature_names': 'feature_names.pkl',
+}
+
+CATEGORY_MODEL_FILES = {
+    'rf': 'category_model.pkl',
+    'le': 'label_encoder.pkl',
+    'ohe': 'onehot_encoder.pkl',
+    'oe': 'ordinal_encoder.pkl',
+}
+
+MODEL_BUNDLES = [
+    ('./p_models', CHURN_MODEL_FILES),
+    ('./c_models', CATEGORY_MODEL_FILES),
+]
+
+BUNDLE_NAME = 'bundle.joblib'
+
+
+def load_pickles(model_dir, files):
+    """
+    Load a directory's model pickles
+
+    Args:
+        model_dir: Directory containing the pickles
+        files: Mapping of bundle key -> pickle file name
+
+    Returns:
+        Dictionary of bundle key -> loaded object
+    """
+    models = {}
+    for key, filename in files.items():
+        with open(os.path.join(model_dir, filename), 'rb') as f:
+            models[key] = pickle.load(f)
+    return models
+
+
+def stale_pickles(model_dir, files):
+    """
+    Pickles modified after the directory's bundle was written
+
+    Args:
+        model_dir: Directory containing the pickles and the bundle
+        files: Mapping of bundle key -> pickle file name
+
+    Returns:
+        List of pickle file names newer than the bundle (all of them when
+        there is no bundle)
+    """
+    bundle_path = os.path.join(model_dir, BUNDLE_NAME)
+    bundle_mtime = os.path.getmtime(bundle_path) if os.path.exists(bundle_path) else float('-inf')
+    return [
+        filename for filename in files.values()
+        if os.path.exists(os.path.join(model_dir, filename))
+        and os.path.getmtime(os.path.join(model_dir, filename)) > bundle_mtime
+    ]
+
+
+def convert_bundle(model_dir, files):
+    """
+    Pack a directory's model pickles into one uncompressed joblib bundle
+
+    Args:
+        model_dir: Directory containing the pickles (the bundle is written here)
+        files: Mapping of bundle key -> pickle file name
+
+    Returns:
+        (bundle path, size of the written file in bytes)
+    """
+    models = load_pickles(model_dir, files)
+    bundle_path = os.path.join(model_dir, BUNDLE_NAME)
+
+    # compress=0 is required for mmap_mode loading
+    joblib.dump(models, bundle_path, compress=0)
+    return bundle_path, os.path.getsize(bundle_path)
+
+
+if __name__ == "__main__":
+    for model_dir, files in MODEL_BUNDLES:
+        missing = [f for f in files.values() if not os.path.exists(os.path.join(model_dir, f))]
+        if missing:
+            print(f"⚠️  Skipping {model_dir} (missing {', '.join(missing)})")
+            continue
+        bundle_path, size = convert_bundle(model_dir, files)
+        print(f"✅ {model_dir} ({len(files)} files) -> {bundle_path} ({size / 1e6:.1f} MB)")
@@ -0,0 +1,125 @@
+"""
+Micro-Batcher - Coalesce Concurrent Model Calls into Batches
+
+Random Forest prediction and TreeSHAP pay a fixed dispatch cost per call,
+regardless of how many rows are passed. This module collects rows submitted
+by concurrent request threads and runs them through the model in one call.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Run a batch function over single rows submitted from many threads
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5, timeout_s=60):
+        """
+        Initialize micro-batcher
+
+        Rows are never held back waiting for company: a batch is whatever is
+        already queued when the worker picks up its first row, so a lone
+        request runs immediately. Rows that arrive while a batch is running
+        queue up and go out together in the next one.
+
+        Args:
+            batch_fn: Function taking a 2D array (n_rows, n_features) and
+                returning one result per row (indexable by row position)
+            max_batch_size: Maximum number of rows per batch_fn call
+            max_wait_ms: Upper bound on the time spent collecting queued rows
+                into one batch
+            timeout_s: How long submit() waits for its result before raising
+                concurrent.futures.TimeoutError
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout_s
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+    def _ensure_worker(self):
+        """Start the worker thread on first use (and again after a fork)"""
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid:
+            return
+
+        with self._lock:
+            if self._worker is None or self._worker_pid != pid:
+                # Threads do not survive fork (e.g. gunicorn --preload), so each
+                # worker process starts its own batching thread and queue
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker_pid = pid
+                self._worker.start()
+
+    def submit(self, row):
+        """
+        Submit one row and block until its result is ready
+
+        Args:
+            row: Feature vector, shape (n_features,) or (1, n_features)
+
+        Returns:
+            batch_fn's result for this row
+        """
+        self._ensure_worker()
+
+        future = Future()
+        self._queue.put((np.asarray(row).reshape(-1), future))
+        return future.result(timeout=self.timeout)
+
+    def _run(self):
+        """Worker loop: take the rows already queued (up to max_batch_size / max_wait), then call batch_fn"""
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            # Stop as soon as the queue is empty instead of waiting for more rows
+            while len(items) < self.max_batch_size and time.monotonic() < deadline:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                batch = np.vstack([row for row, _ in items])
+                results = self.batch_fn(batch)
+                if len(results) != len(items):
+                    raise ValueError(f"batch_fn returned {len(results)} results for {len(items)} rows")
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            for i, (_, future) in enumerate(items):
+                future.set_result(results[i])
+
+
+# Example usage
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    calls = []
+
+    def row_sums(batch):
+        calls.append(len(batch))
+        return batch.sum(axis=1)
+
+    batcher = MicroBatcher(row_sums, max_batch_size=16, max_wait_ms=5)
+    rows = [np.full(4, i, dtype=float) for i in range(64)]
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        results = list(executor.map(batcher.submit, rows))
+
+    print(f"Results correct: {all(r == 4 * i for i, r in enumerate(results))}")
+    print(f"Rows: {len(rows)} | batch_fn calls: {len(calls)} | sizes: {calls}")
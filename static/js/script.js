@@ -8,6 +8,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeFormValidation();
     animateFeatureBars();
     addFormInteractivity();
+    initializeExplainPanel();
 });
 
 // ===== Animate Feature Bars =====
@@ -25,6 +26,123 @@ function animateFeatureBars() {
     });
 }
 
+// ===== Lazy SHAP Explanation =====
+function initializeExplainPanel() {
+    const explainForm = document.getElementById('explainForm');
+    const explainCard = document.getElementById('explainCard');
+    if (!explainForm || !explainCard) return;
+
+    // Without JS the form posts normally and /explain renders the full page
+    explainForm.addEventListener('submit', function(e) {
+        e.preventDefault();
+
+        const button = explainForm.querySelector('.submit-button');
+        button.innerHTML = `
+            <i class="fas fa-spinner fa-spin"></i>
+            <span>Analyzing...</span>
+        `;
+        button.disabled = true;
+
+        fetch(explainForm.action, {
+            method: 'POST',
+            body: new FormData(explainForm),
+            headers: { 'Accept': 'application/json' }
+        })
+            .then(response => response.json())
+            .then(result => {
+                if (result.error) throw new Error(result.error);
+                renderExplanation(explainCard, result);
+            })
+            .catch(error => {
+                console.error('Explanation failed:', error);
+                explainForm.submit();
+            });
+    });
+}
+
+// ===== Render /explain Results =====
+function renderExplanation(explainCard, result) {
+    const cards = [];
+
+    if (result.category) {
+        const card = createResultCard('category-card', 'fa-tags', 'Churn Category');
+        const badge = document.createElement('div');
+        badge.className = 'category-badge';
+        badge.textContent = result.category;
+        card.appendChild(badge);
+        cards.push(card);
+    }
+
+    if (result.top_features && result.top_features.length) {
+        const card = createResultCard('shap-card', 'fa-chart-bar', 'Top Risk Factors', 'SHAP Analysis');
+        const list = document.createElement('div');
+        list.className = 'features-list';
+
+        result.top_features.forEach(feature => {
+            const item = document.createElement('div');
+            item.className = 'feature-item';
+            item.innerHTML = `
+                <span class="feature-name"></span>
+                <div class="feature-bar-container">
+                    <div class="feature-bar"></div>
+                </div>
+                <span class="feature-value"></span>
+            `;
+            item.querySelector('.feature-name').textContent = feature.name;
+            item.querySelector('.feature-value').textContent = feature.value + '%';
+            item.querySelector('.feature-bar').setAttribute('data-width', feature.value);
+            list.appendChild(item);
+        });
+
+        card.appendChild(list);
+        cards.push(card);
+    }
+
+    explainCard.replaceWith(...cards);
+
+    // Category-specific actions are merged into the action plan
+    const recommendationsList = document.querySelector('.recommendations-list');
+    if (recommendationsList && result.recommendations) {
+        recommendationsList.innerHTML = '';
+        result.recommendations.forEach(rec => {
+            const li = document.createElement('li');
+            li.innerHTML = '<i class="fas fa-arrow-right"></i> ';
+            li.appendChild(document.createTextNode(rec));
+            recommendationsList.appendChild(li);
+        });
+    }
+
+    cards.forEach(card => {
+        card.querySelectorAll('.feature-bar').forEach(bar => {
+            const width = parseFloat(bar.getAttribute('data-width'));
+            const clampedWidth = Math.min(Math.max(width, 0), 100);
+            setTimeout(() => {
+                bar.style.width = clampedWidth + '%';
+            }, 100);
+        });
+    });
+}
+
+// ===== Create Result Card =====
+function createResultCard(className, icon, title, badgeText) {
+    const card = document.createElement('div');
+    card.className = `result-card ${className}`;
+    card.innerHTML = `
+        <div class="card-header">
+            <h3><i class="fas ${icon}"></i> </h3>
+        </div>
+    `;
+    card.querySelector('h3').appendChild(document.createTextNode(title));
+
+    if (badgeText) {
+        const badge = document.createElement('span');
+        badge.className = 'badge';
+        badge.textContent = badgeText;
+        card.querySelector('.card-header').appendChild(badge);
+    }
+    return card;
+}
+
 // ===== Smooth Scroll Animations =====
 function initializeAnimations() {
     const observer = new IntersectionObserver((entries) => {
@@ -5,9 +5,146 @@ This module optimizes the prediction threshold based on business costs
 instead of using the default 0.5 threshold.
 """
 
+from functools import lru_cache
+
 import numpy as np
-import pandas as pd
-from sklearn.metrics import confusion_matrix, classification_report
+
+# predict_batch() label lookups, indexed by risk_index / recommendation_index
+RISK_LEVELS = np.array(['Low', 'Medium', 'High', 'Critical'])
+RISK_COLORS = np.array(['green', 'yellow', 'orange', 'red'])
+RECOMMENDATIONS = np.array([
+    "URGENT: Immediate retention intervention required",
+    "Proactive retention campaign recommended",
+    "Monitor customer satisfaction"
+])
+
+# The threshold sweeps are compiled with Numba when it can be imported
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+def _sweep(sorted_proba, sorted_y, thresholds, out_fn, out_tn):
+    """
+    Fill false/true negative counts for ascending thresholds in one pass
+    
+    Walks the sorted probabilities once with a second cursor on the
+    thresholds; customers with proba < threshold are predicted 0.
+    """
+    n = sorted_proba.shape[0]
+    idx = 0
+    cum_pos = 0
+    for t in range(thresholds.shape[0]):
+        while idx < n and sorted_proba[idx] < thresholds[t]:
+            cum_pos += sorted_y[idx]
+            idx += 1
+        out_fn[t] = cum_pos
+        out_tn[t] = idx - cum_pos
+
+
+def _sweep_parallel(sorted_proba, cum_pos, thresholds, out_fn, out_tn):
+    """
+    Fill false/true negative counts with an independent binary search per threshold
+    
+    cum_pos[i] is the number of positives in sorted_proba[:i]. It is computed
+    before the parallel loop, so iterations only read shared data and each
+    writes its own output slot.
+    """
+    n = sorted_proba.shape[0]
+    for t in prange(thresholds.shape[0]):
+        # First index with sorted_proba[idx] >= threshold
+        lo = 0
+        hi = n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if sorted_proba[mid] < thresholds[t]:
+                lo = mid + 1
+            else:
+                hi = mid
+        out_fn[t] = cum_pos[lo]
+        out_tn[t] = lo - cum_pos[lo]
+
+
+if HAS_NUMBA:
+    _sweep = njit(cache=True)(_sweep)
+    _sweep_parallel = njit(parallel=True, cache=True)(_sweep_parallel)
+
+# Dense threshold grids are split across cores; smaller ones use the single pass
+PARALLEL_SWEEP_MIN_THRESHOLDS = 4096
+
+
+def sweep_negatives(sorted_proba, sorted_y, thresholds):
+    """
+    False and true negatives at each threshold (y_pred = proba >= threshold)
+    
+    Args:
+        sorted_proba: Probabilities sorted ascending
+        sorted_y: Labels (0/1, int64) in the same order
+        thresholds: Thresholds to evaluate, any order
+        
+    Returns:
+        (fn, tn) arrays aligned with thresholds
+    """
+    if HAS_NUMBA and len(thresholds) >= PARALLEL_SWEEP_MIN_THRESHOLDS:
+        fn = np.empty(len(thresholds), dtype=np.int64)
+        tn = np.empty(len(thresholds), dtype=np.int64)
+        cum_pos = np.concatenate(([0], np.cumsum(sorted_y)))
+        _sweep_parallel(sorted_proba, cum_pos, thresholds, fn, tn)
+        return fn, tn
+    
+    if HAS_NUMBA:
+        order = np.argsort(thresholds, kind='stable')
+        fn = np.empty(len(thresholds), dtype=np.int64)
+        tn = np.empty(len(thresholds), dtype=np.int64)
+        fn_sorted = np.empty_like(fn)
+        tn_sorted = np.empty_like(tn)
+        _sweep(sorted_proba, sorted_y, thresholds[order], fn_sorted, tn_sorted)
+        fn[order] = fn_sorted
+        tn[order] = tn_sorted
+        return fn, tn
+    
+    # Customers below the split index are predicted 0
+    split = np.searchsorted(sorted_proba, thresholds, side='left')
+    cum_pos = np.concatenate(([0], np.cumsum(sorted_y)))
+    fn = cum_pos[split]
+    return fn, split - fn
+
+
+def as_comparison_dtype(thresholds, proba):
+    """
+    Thresholds in the precision y_proba >= threshold compares them in
+    
+    With NumPy 1.x value-based casting, comparing a float32 array with a
+    float64 threshold casts the threshold down, so a probability equal to
+    float32(threshold) counts as predicted 1. Casting the thresholds the
+    same way keeps sweep counts identical to that comparison. Non-float
+    probabilities are compared in float64.
+    """
+    if np.issubdtype(proba.dtype, np.floating):
+        return thresholds.astype(proba.dtype, copy=False)
+    return thresholds
+
+
+# numba.cuda, imported by _cuda_threshold_kernel() on first GPU use so that
+# CPU-only installs (and app startup) never pay for it
+cuda = None
+
+
+def _threshold_kernel(proba, threshold, out):
+    """GPU kernel: one thread per customer, out[i] = proba[i] >= threshold"""
+    i = cuda.grid(1)
+    if i < proba.size:
+        out[i] = 1 if proba[i] >= threshold else 0
+
+
+@lru_cache(maxsize=None)
+def _cuda_threshold_kernel():
+    """Compile _threshold_kernel for the GPU on first use"""
+    global cuda
+    from numba import cuda
+    return cuda.jit(_threshold_kernel)
 
 
 class ThresholdOptimizer:
@@ -26,7 +163,24 @@ class ThresholdOptimizer:
         self.cost_fp = cost_fp
         self.cost_fn = cost_fn
         self.optimal_threshold = 0.5  # default
-        self.threshold_analysis = None
+        self._results = None             # Sweep results: column name -> ndarray
+        self._threshold_analysis = None  # DataFrame view, built on first access
+        self._optimal_row = None         # Sweep results at the minimum-cost threshold
+        self._sweep_cache = None         # Sorted inputs and counts of the last sweep
+    
+    @property
+    def threshold_analysis(self):
+        """
+        Per-threshold results of the last find_optimal_threshold() call
+        
+        Returns:
+            DataFrame with one row per threshold (None before optimization)
+        """
+        if self._threshold_analysis is None and self._results is not None:
+            # pandas is only needed for this view, so it is imported on first use
+            import pandas as pd
+            self._threshold_analysis = pd.DataFrame(self._results)
+        return self._threshold_analysis
         
     def calculate_cost(self, y_true, y_pred):
         """
@@ -39,7 +193,13 @@ class ThresholdOptimizer:
         Returns:
             Total cost
         """
-        tn, fp, fn, tp = confusion_matrix(y_true, y_pred).ravel()
+        # Count the four cells directly from boolean masks
+        actual = np.asarray(y_true) == 1
+        predicted = np.asarray(y_pred) == 1
+        tp = int(np.count_nonzero(actual & predicted))
+        fp = int(np.count_nonzero(predicted)) - tp
+        fn = int(np.count_nonzero(actual)) - tp
+        tn = actual.size - tp - fp - fn
         
         # Cost calculation
         total_cost = (fp * self.cost_fp) + (fn * self.cost_fn)
@@ -50,6 +210,15 @@ class ThresholdOptimizer:
         """
         Find optimal threshold by minimizing business cost
         
+        The sort and the per-threshold counts only depend on the inputs, so
+        they are kept from the previous call. Calling again with the same
+        y_true / y_proba objects (e.g. after changing cost_fp / cost_fn) only
+        recomputes the costs; inputs must not be modified in place in between.
+        
+        As with y_proba >= threshold, NaN probabilities count as predicted
+        negative at every threshold, and float32 probabilities are compared
+        in float32 (see as_comparison_dtype()).
+        
         Args:
             y_true: Actual labels
             y_proba: Predicted probabilities for churn class
@@ -59,40 +228,194 @@ class ThresholdOptimizer:
             Optimal threshold
         """
         if thresholds is None:
-            thresholds = np.arange(0.1, 0.91, 0.01)
+            thresholds = np.linspace(0.1, 0.9, 81)  # 0.01 steps, exact endpoints
+        thresholds = np.asarray(thresholds, dtype=float)
         
-        results = []
+        cache = self._sorted_inputs(y_true, y_proba)
         
-        for threshold in thresholds:
-            # Make predictions at this threshold
-            y_pred = (y_proba >= threshold).astype(int)
+        if cache['thresholds'] is None or not np.array_equal(cache['thresholds'], thresholds):
+            fn, tn = sweep_negatives(cache['sorted_proba'], cache['sorted_y'],
+                                     as_comparison_dtype(thresholds, cache['sorted_proba']))
+            cache['fn'] = fn + cache['nan_pos']
+            cache['tn'] = tn + cache['nan_neg']
+            cache['thresholds'] = thresholds.copy()
+        
+        return self._record_sweep(thresholds, cache['fn'], cache['tn'], cache['n_pos'], cache['n_neg'])
+    
+    def _sorted_inputs(self, y_true, y_proba):
+        """
+        Sort the inputs for a sweep, reusing the last sort for the same objects
+        
+        Returns:
+            The sweep cache entry (sorted_proba, sorted_y, n_pos, n_neg and the
+            last thresholds / fn / tn evaluated on them)
+        """
+        cache = self._sweep_cache
+        if cache is None or cache['y_true'] is not y_true or cache['y_proba'] is not y_proba:
+            proba = np.asarray(y_proba)
+            is_pos = np.asarray(y_true) == 1
             
-            # Calculate cost
-            total_cost, fp, fn, tn, tp = self.calculate_cost(y_true, y_pred)
+            # NaN never satisfies proba >= threshold, so those customers are
+            # negatives at every threshold; they are counted aside instead of
+            # being sorted to the end (where the sweep would treat them as positive)
+            is_nan = np.isnan(proba)
+            nan_pos = int(np.count_nonzero(is_pos & is_nan))
+            nan_neg = int(np.count_nonzero(is_nan)) - nan_pos
+            if nan_pos or nan_neg:
+                proba = proba[~is_nan]
+                is_pos = is_pos[~is_nan]
             
-            # Calculate metrics
-            precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-            recall = tp / (tp + fn) if (tp + fn) > 0 else 0
-            f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+            # Sort once; a threshold then splits the customers at one index instead
+            # of needing a confusion matrix per threshold
+            order = np.argsort(proba, kind='stable')
+            sorted_y = is_pos[order].astype(np.int64)
+            n_pos = sorted_y.sum()
+            cache = self._sweep_cache = {
+                'y_true': y_true,
+                'y_proba': y_proba,
+                'sorted_proba': proba[order],
+                'sorted_y': sorted_y,
+                'nan_pos': nan_pos,
+                'nan_neg': nan_neg,
+                'n_pos': n_pos + nan_pos,
+                'n_neg': len(sorted_y) - n_pos + nan_neg,
+                'thresholds': None
+            }
+        return cache
+    
+    def find_optimal_threshold_exact(self, y_true, y_proba, threshold_range=(0.1, 0.9)):
+        """
+        Find the minimum-cost threshold over every distinct split of the customers
+        
+        The cost only changes where the threshold crosses a predicted
+        probability, so apart from the ends of threshold_range the only
+        thresholds worth testing are the midpoints between adjacent distinct
+        probabilities. Evaluating exactly those finds the true minimum within
+        the range, which the fixed 0.01 grid of find_optimal_threshold() can
+        miss. Results are recorded the same way (one row per candidate).
+        
+        Args:
+            y_true: Actual labels
+            y_proba: Predicted probabilities for churn class
+            threshold_range: (lowest, highest) threshold to consider
             
-            results.append({
-                'threshold': threshold,
-                'total_cost': total_cost,
-                'fp': fp,
-                'fn': fn,
-                'tn': tn,
-                'tp': tp,
-                'precision': precision,
-                'recall': recall,
-                'f1': f1
-            })
-        
-        # Convert to DataFrame
-        self.threshold_analysis = pd.DataFrame(results)
-        
-        # Find threshold with minimum cost
-        min_cost_idx = self.threshold_analysis['total_cost'].idxmin()
-        self.optimal_threshold = self.threshold_analysis.loc[min_cost_idx, 'threshold']
+        Returns:
+            Optimal threshold
+        """
+        sorted_proba = self._sorted_inputs(y_true, y_proba)['sorted_proba']
+        
+        is_distinct = np.ones(len(sorted_proba), dtype=bool)
+        is_distinct[1:] = sorted_proba[1:] != sorted_proba[:-1]
+        distinct = sorted_proba[is_distinct]
+        midpoints = (distinct[:-1] + distinct[1:]) / 2
+        
+        low, high = threshold_range
+        candidates = np.concatenate(([low], midpoints[(midpoints > low) & (midpoints < high)], [high]))
+        
+        return self.find_optimal_threshold(y_true, y_proba, candidates)
+    
+    def find_optimal_threshold_binned(self, y_true, y_proba, n_bins=65536,
+                                      threshold_range=(0.1, 0.9)):
+        """
+        Find optimal threshold from class histograms of quantized probabilities
+        
+        Probabilities are quantized to n_bins levels and counted per class in
+        one pass, so no sort is needed and the sweep costs O(n_bins) whatever
+        the number of customers. Every threshold b / (n_bins - 1) inside
+        threshold_range is evaluated - far finer than the default 0.01 grid -
+        with the same counts find_optimal_threshold() gives for it.
+        NaN probabilities count as predicted negative, as in find_optimal_threshold().
+        
+        Args:
+            y_true: Actual labels
+            y_proba: Predicted probabilities for churn class (0-1)
+            n_bins: Number of quantization levels (at most 65536)
+            threshold_range: (lowest, highest) threshold to consider
+            
+        Returns:
+            Optimal threshold
+        """
+        if not 2 <= n_bins <= 65536:
+            raise ValueError("n_bins must be between 2 and 65536")
+        scale = n_bins - 1
+        
+        y_proba = np.asarray(y_proba)
+        if not np.issubdtype(y_proba.dtype, np.floating):
+            y_proba = y_proba.astype(float)
+        is_pos = np.asarray(y_true) == 1
+        
+        # NaN probabilities are predicted 0 at every threshold: keep them out of
+        # the histograms and add them to the negatives directly
+        is_nan = np.isnan(y_proba)
+        nan_pos = int(np.count_nonzero(is_pos & is_nan))
+        nan_neg = int(np.count_nonzero(is_nan)) - nan_pos
+        
+        # Bin b holds probabilities in [edges[b], edges[b + 1]), where the edges
+        # are the reported thresholds. floor(p * scale) can be one bin off for a
+        # probability on (or next to) an edge, so it is corrected with the same
+        # >= comparison the thresholds use; a probability equal to a threshold
+        # then lands in that threshold's bin.
+        edges = np.arange(n_bins) / scale
+        comparison_edges = as_comparison_dtype(edges, y_proba)
+        p = y_proba[~is_nan]
+        q = np.clip(np.floor(p * scale), 0, scale).astype(np.int64)
+        q += (q < scale) & (comparison_edges[np.minimum(q + 1, scale)] <= p)
+        q -= (q > 0) & (comparison_edges[q] > p)
+        is_pos = is_pos[~is_nan]
+        cum_pos = np.concatenate(([0], np.cumsum(np.bincount(q[is_pos], minlength=n_bins))))
+        cum_neg = np.concatenate(([0], np.cumsum(np.bincount(q[~is_pos], minlength=n_bins))))
+        
+        # Threshold edges[b] predicts 0 for every bin below b
+        low, high = threshold_range
+        bins = np.nonzero((edges >= low) & (edges <= high))[0]
+        fn = cum_pos[bins] + nan_pos
+        tn = cum_neg[bins] + nan_neg
+        
+        return self._record_sweep(edges[bins], fn, tn, cum_pos[-1] + nan_pos, cum_neg[-1] + nan_neg)
+    
+    def _record_sweep(self, thresholds, fn, tn, n_pos, n_neg):
+        """
+        Derive costs and metrics from per-threshold negatives and store them
+        
+        Args:
+            thresholds: Thresholds evaluated
+            fn, tn: False / true negatives at each threshold
+            n_pos, n_neg: Total positives / negatives
+            
+        Returns:
+            Optimal threshold
+        """
+        tp = n_pos - fn
+        fp = n_neg - tn
+        
+        # Cost calculation
+        total_cost = (fp * self.cost_fp) + (fn * self.cost_fn)
+        
+        # Calculate metrics
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+            recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+            f1 = np.where(precision + recall > 0,
+                          2 * (precision * recall) / (precision + recall), 0.0)
+        
+        # Keep the columns as arrays; the DataFrame is only built if read
+        self._results = {
+            'threshold': thresholds,
+            'total_cost': total_cost,
+            'fp': fp,
+            'fn': fn,
+            'tn': tn,
+            'tp': tp,
+            'precision': precision,
+            'recall': recall,
+            'f1': f1
+        }
+        self._threshold_analysis = None
+        
+        # Find threshold with minimum cost; its row is kept for get_threshold_summary()
+        min_cost_idx = np.argmin(total_cost)
+        self._optimal_row = {name: values[min_cost_idx] for name, values in self._results.items()}
+        self.optimal_threshold = thresholds[min_cost_idx]
         
         return self.optimal_threshold
     
@@ -108,48 +431,79 @@ class ThresholdOptimizer:
         """
         return (y_proba >= self.optimal_threshold).astype(int)
     
+    def predict_with_optimal_threshold_cuda(self, d_proba, d_pred, threads_per_block=256):
+        """
+        Make predictions on the GPU for probabilities already in device memory
+        
+        Only worth it when the probabilities are on the device anyway (part of
+        a larger GPU pipeline); copying them over just to threshold them costs
+        more than predict_with_optimal_threshold() on the host.
+        
+        Args:
+            d_proba: Device array of churn probabilities, shape (n,)
+            d_pred: Preallocated device array receiving 0/1 predictions, shape (n,)
+            threads_per_block: CUDA block size
+            
+        Returns:
+            d_pred
+        """
+        kernel = _cuda_threshold_kernel()
+        if not cuda.is_available():
+            raise RuntimeError("No CUDA device available")
+        
+        n = d_proba.size
+        if n:
+            blocks = (n + threads_per_block - 1) // threads_per_block
+            kernel[blocks, threads_per_block](d_proba, self.optimal_threshold, d_pred)
+        return d_pred
+    
     def get_threshold_summary(self):
         """
         Get summary of optimal threshold analysis
         
         Returns:
-            Dictionary with key metrics
+            Dictionary with key metrics (min_total_cost is a numpy float64,
+            as read from a row of threshold_analysis)
         """
-        if self.threshold_analysis is None:
+        if self._optimal_row is None:
             return None
         
-        min_cost_idx = self.threshold_analysis['total_cost'].idxmin()
-        optimal_row = self.threshold_analysis.loc[min_cost_idx]
+        row = self._optimal_row
         
         return {
             'optimal_threshold': self.optimal_threshold,
-            'min_total_cost': optimal_row['total_cost'],
-            'false_positives': int(optimal_row['fp']),
-            'false_negatives': int(optimal_row['fn']),
-            'precision': optimal_row['precision'],
-            'recall': optimal_row['recall'],
-            'f1_score': optimal_row['f1'],
+            'min_total_cost': np.float64(row['total_cost']),
+            'false_positives': int(row['fp']),
+            'false_negatives': int(row['fn']),
+            'precision': row['precision'],
+            'recall': row['recall'],
+            'f1_score': row['f1'],
             'cost_fp': self.cost_fp,
             'cost_fn': self.cost_fn
         }
     
-    def predict_single(self, churn_probability):
+    def predict_single(self, churn_probability, threshold=None):
         """
         Predict for a single customer using optimal threshold
         
         Args:
             churn_probability: Probability of churn (0-1)
+            threshold: Threshold for this customer only (default: optimal_threshold).
+                Pass it here rather than setting optimal_threshold when the
+                optimizer is shared between concurrent requests.
             
         Returns:
             Prediction (0 or 1), risk level, recommendation
         """
-        prediction = 1 if churn_probability >= self.optimal_threshold else 0
+        if threshold is None:
+            threshold = self.optimal_threshold
+        prediction = 1 if churn_probability >= threshold else 0
         
         # Determine risk level
         if churn_probability >= 0.7:
             risk_level = "Critical"
             color = "red"
-        elif churn_probability >= self.optimal_threshold:
+        elif churn_probability >= threshold:
             risk_level = "High"
             color = "orange"
         elif churn_probability >= 0.3:
@@ -174,9 +528,50 @@ class ThresholdOptimizer:
             'risk_level': risk_level,
             'color': color,
             'recommendation': recommendation,
-            'threshold_used': self.optimal_threshold
+            'threshold_used': threshold
         }
 
+    
+    def predict_batch(self, y_proba, threshold=None):
+        """
+        Predict for many customers at once using optimal threshold
+        
+        Same rules as predict_single(), evaluated as array operations. Labels
+        are returned as indices; look them up with RISK_LEVELS[risk_index],
+        RISK_COLORS[risk_index] and RECOMMENDATIONS[recommendation_index].
+        
+        Args:
+            y_proba: Churn probabilities, shape (n,)
+            threshold: Threshold for this call only (default: optimal_threshold)
+            
+        Returns:
+            Dictionary of arrays:
+                - prediction: 0 or 1
+                - probability: the input probabilities
+                - risk_index: 0 (Low) .. 3 (Critical)
+                - recommendation_index: 0 (urgent), 1 (proactive), 2 (monitor)
+                - threshold_used: the threshold applied (scalar)
+        """
+        y_proba = np.asarray(y_proba, dtype=float)
+        if threshold is None:
+            threshold = self.optimal_threshold
+        prediction = (y_proba >= threshold).astype(int)
+        
+        # Checked in predict_single()'s order, which also holds when the
+        # threshold is outside [0.3, 0.7]
+        risk_index = np.where(y_proba >= 0.7, 3,
+                              np.where(y_proba >= threshold, 2,
+                                       np.where(y_proba >= 0.3, 1, 0)))
+        recommendation_index = np.where(prediction == 1,
+                                        np.where(risk_index == 3, 0, 1), 2)
+        
+        return {
+            'prediction': prediction,
+            'probability': y_proba,
+            'risk_index': risk_index,
+            'recommendation_index': recommendation_index,
+            'threshold_used': threshold
+        }
 
 # Example usage function for testing
 def optimize_threshold_example(model, X_test, y_test):